@@ -8,23 +8,44 @@ Usage:
 """
 
 import argparse
+import functools
 import json
+import mmap
 import os
 import re
 
-# Internal default endpoint body used when no external template is provided.
-DEFAULT_ENDPOINT_BODY = {
-    "competition": {"name": None, "season": None, "round": None},
-    "venue": {"name": None, "city": None},
-    "kickoff": None,
-    "status": None,
-    "teams": {"home": None, "away": None},
-    "score": {"home": None, "away": None, "halfTime": {"home": None, "away": None}},
-    "scorers": [],
-    "lineups": {},
-}
+try:
+    import msgspec
+except ImportError:
+    # msgspec is optional; it only speeds up decoding of the (large) RES files.
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional; it only speeds up writing the assembled output.
+    orjson = None
+
+
+def new_endpoint_body():
+    """Return a fresh internal default endpoint body (no external template is used).
+
+    Built from a literal on every call, so each unit gets its own mutable copy
+    without cloning a shared template.
+    """
+    return {
+        "competition": {"name": None, "season": None, "round": None},
+        "venue": {"name": None, "city": None},
+        "kickoff": None,
+        "status": None,
+        "teams": {"home": None, "away": None},
+        "score": {"home": None, "away": None, "halfTime": {"home": None, "away": None}},
+        "scorers": [],
+        "lineups": {},
+    }
 
 
+@functools.lru_cache(maxsize=256)
 def canonicalize_event(ev, length=22, pad_char='-'):
     if ev is None:
         return ev
@@ -33,70 +54,147 @@ def canonicalize_event(ev, length=22, pad_char='-'):
     return ev.ljust(length, pad_char)
 
 
+# Reused decoder instance; avoids per-call setup when msgspec is installed.
+_JSON_DECODER = msgspec.json.Decoder() if msgspec is not None else None
+
+
+# Files larger than this are memory-mapped and decoded in place (msgspec only),
+# avoiding a copy of the whole file into a bytes object.
+_MMAP_THRESHOLD = 64 * 1024
+
+
 def load_json(path):
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(path, 'rb') as f:
+            if _JSON_DECODER is not None and os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    return _JSON_DECODER.decode(mm)
+            raw = f.read()
+        if _JSON_DECODER is not None:
+            return _JSON_DECODER.decode(raw)
+        return json.loads(raw)
     except Exception:
         return None
 
 
+def iter_units(event):
+    """Yield every unit of an event (`event.phases[].units[]`), skipping non-list entries."""
+    phases = event.get('phases', [])
+    if not isinstance(phases, list):
+        return
+    for phase in phases:
+        units = phase.get('units')
+        if isinstance(units, list):
+            yield from units
+
+
 def find_res_file(tmp_dir, comp, disc, unit_code, lang):
     fname = f"RES_ByRSC_H2H~comp={comp}~disc={disc}~rscResult={unit_code}~lang={lang}.json"
     path = os.path.join(tmp_dir, fname)
     return path if os.path.exists(path) else None
 
 
+_MINUTE_RE = re.compile(r"(\d{1,3})")
+
+
 def _parse_minute(pb_when):
     # pb_when examples: "25'", "105'", "105' +3", "120'"
     if not pb_when:
         return None
-    m = re.search(r"(\d{1,3})", str(pb_when))
+    m = _MINUTE_RE.search(pb_when if isinstance(pb_when, str) else str(pb_when))
     return int(m.group(1)) if m else None
 
 
-def _collect_scorers(res_json, athlete_map, team_map):
-    scorers = []
+# play-by-play athlete roles (pbpat_role) reduced to small integer codes
+_ROLE_OTHER = 0
+_ROLE_SCORER = 1
+_ROLE_ASSIST = 2
+
+# bit flags describing a play-by-play result (pbpa_Result)
+_RESULT_GOAL = 1
+_RESULT_PEN = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _role_code(role):
+    # roles come from a tiny vocabulary ('SCR', 'ASSIST', ...), so caching removes per-athlete string work
+    if not role:
+        return _ROLE_OTHER
+    upper = role.upper()
+    if upper.startswith('SCR'):
+        return _ROLE_SCORER
+    if upper.startswith('ASS'):
+        return _ROLE_ASSIST
+    return _ROLE_OTHER
+
+
+@functools.lru_cache(maxsize=None)
+def _result_flags(result):
+    if not result:
+        return 0
+    flags = _RESULT_GOAL if 'GOAL' in str(result).upper() else 0
+    # penalty detection is case-sensitive
+    if isinstance(result, str) and 'PEN' in result:
+        flags |= _RESULT_PEN
+    return flags
+
+
+def _iter_goal_actions(res_json):
+    """Yield (action, result_flags) for goal-like play-by-play actions only.
+
+    GOAL results and PEN actions are treated as scorer entries; everything else
+    (the vast majority of actions) is filtered out here.
+    """
     for sub in res_json.get('playByPlay', []):
         for act in sub.get('actions', []):
-            result = act.get('pbpa_Result') or act.get('pbpa_Result')
-            action = act.get('pbpa_Action')
-            # treat GOAL actions (or PEN with GOAL) as scorer entries
-            if (result and 'GOAL' in str(result).upper()) or action in ('PEN',):
-                comps = act.get('competitors', [])
-                if not comps:
-                    continue
-                comp = comps[0]
-                team_code = comp.get('pbpc_code') or comp.get('pbpc_code')
-                team_name = team_map.get(team_code)
-                athletes = comp.get('athletes', [])
-                scorer = None
-                assist = None
-                for ath in athletes:
-                    role = ath.get('pbpat_role', '')
-                    code = ath.get('pbpat_code')
-                    if role and role.upper().startswith('SCR') or role == 'SCR':
-                        scorer = {'player': athlete_map.get(code), 'minute': _parse_minute(act.get('pbpa_When'))}
-                    elif role and role.upper().startswith('ASS') or role == 'ASSIST' or role == 'ASS':
-                        assist = athlete_map.get(code)
-                # fallback: if no role info, take first athlete code as scorer
-                if not scorer and athletes:
-                    code = athletes[0].get('pbpat_code')
-                    scorer = {'player': athlete_map.get(code), 'minute': _parse_minute(act.get('pbpa_When'))}
-                if scorer:
-                    entry = {'team': team_name or team_code, 'player': scorer.get('player'), 'minute': scorer.get('minute')}
-                    if assist:
-                        entry['assist'] = assist
-                    # rudimentary type detection
-                    t = 'open_play'
-                    if 'PEN' in (act.get('pbpa_Result') or '') or act.get('pbpa_period') == 'PET' or act.get('pbpa_period') == 'PEN':
-                        t = 'penalty'
-                    entry['type'] = t
-                    scorers.append(entry)
+            result_flags = _result_flags(act.get('pbpa_Result'))
+            if result_flags & _RESULT_GOAL or act.get('pbpa_Action') == 'PEN':
+                yield act, result_flags
+
+
+def _collect_scorers(res_json, athlete_map, team_map):
+    scorers = []
+    for act, result_flags in _iter_goal_actions(res_json):
+        comps = act.get('competitors', [])
+        if not comps:
+            continue
+        comp = comps[0]
+        athletes = comp.get('athletes', [])
+        if not athletes:
+            continue
+        # resolve roles to athlete codes first; names and minute are looked up once per action
+        scorer_code = None
+        has_scorer = False
+        assist = None
+        for ath in athletes:
+            role = _role_code(ath.get('pbpat_role'))
+            if role == _ROLE_SCORER:
+                scorer_code = ath.get('pbpat_code')
+                has_scorer = True
+            elif role == _ROLE_ASSIST:
+                assist = athlete_map.get(ath.get('pbpat_code'))
+        # fallback: if no role info, take first athlete code as scorer
+        if not has_scorer:
+            scorer_code = athletes[0].get('pbpat_code')
+        team_code = comp.get('pbpc_code')
+        entry = {
+            'team': team_map.get(team_code) or team_code,
+            'player': athlete_map.get(scorer_code),
+            'minute': _parse_minute(act.get('pbpa_When')),
+        }
+        if assist:
+            entry['assist'] = assist
+        # rudimentary type detection
+        period = act.get('pbpa_period')
+        if result_flags & _RESULT_PEN or period == 'PET' or period == 'PEN':
+            entry['type'] = 'penalty'
+        else:
+            entry['type'] = 'open_play'
+        scorers.append(entry)
     return scorers
 
 
-def _build_lineup(team_item):
+def _build_lineup(team_item, athlete_map=None):
     lineup = {
         'team': team_item.get('participant', {}).get('name') if team_item.get('participant') else team_item.get('participant', {}).get('name') if team_item.get('participant') else None,
         'formation': None,
@@ -116,6 +214,8 @@ def _build_lineup(team_item):
     bench = []
     for ath in team_item.get('teamAthletes', []):
         athlete = ath.get('athlete') or {}
+        if athlete_map is not None:
+            athlete_map[ath.get('participantCode')] = athlete.get('name') or athlete.get('shortName')
         name = athlete.get('name') or f"{ath.get('participantCode')}"
         number = int(ath.get('bib')) if ath.get('bib') and str(ath.get('bib')).isdigit() else ath.get('bib')
         position = None
@@ -133,6 +233,20 @@ def _build_lineup(team_item):
     return lineup
 
 
+def _index_items(items):
+    """Return (athlete_map, team_map, lineups) built in a single pass over RES items.
+
+    `lineups` is parallel to `items`; `athlete_map` is filled while building them.
+    """
+    athlete_map = {}
+    team_map = {}
+    lineups = []
+    for itm in items:
+        team_map[itm.get('teamCode')] = itm.get('participant', {}).get('name')
+        lineups.append(_build_lineup(itm, athlete_map))
+    return athlete_map, team_map, lineups
+
+
 def assemble(comp, event, lang, tmp_dir):
     event_code = canonicalize_event(event)
     result = {}
@@ -150,13 +264,7 @@ def assemble(comp, event, lang, tmp_dir):
     event_obj = main_json.get('event', {})
 
     # collect units
-    units = []
-    for phase in event_obj.get('phases', []):
-        for unit in phase.get('units', []) if isinstance(phase.get('units'), list) else []:
-            units.append(unit)
-
-    # Use the internal default template body; external template files are not used.
-    template_body = DEFAULT_ENDPOINT_BODY
+    units = list(iter_units(event_obj))
 
     # ensure there are units and target all of them
     if not units:
@@ -207,8 +315,8 @@ def assemble(comp, event, lang, tmp_dir):
         if res_path:
             used_files.add(os.path.basename(res_path))
 
-        # shallow copy to mutate per-unit
-        out_body = json.loads(json.dumps(template_body))
+        # fresh body to mutate per-unit
+        out_body = new_endpoint_body()
 
         # Fill competition
         out_body.setdefault('competition', {})
@@ -226,7 +334,8 @@ def assemble(comp, event, lang, tmp_dir):
             out_body.setdefault('venue', {})
             out_body['venue']['name'] = venue.get('description') or out_body['venue'].get('name')
             # try to get city from location
-            city = location.get('shortDescription') or (location.get('longDescription').split(',')[-1].strip() if location.get('longDescription') else None)
+            long_desc = location.get('longDescription')
+            city = location.get('shortDescription') or (long_desc.rpartition(',')[2].strip() if long_desc else None)
             out_body['venue']['city'] = city or out_body['venue'].get('city')
 
             out_body['kickoff'] = schedule.get('startDate') or out_body.get('kickoff')
@@ -272,34 +381,26 @@ def assemble(comp, event, lang, tmp_dir):
                 out_body['score']['halfTime']['home'] = int(h1.get('home', {}).get('score') or 0)
                 out_body['score']['halfTime']['away'] = int(h1.get('away', {}).get('score') or 0)
 
-            # build helper maps
-            athlete_map = {}
-            team_map = {}
-            for itm in res.get('items', []):
-                team_map[itm.get('teamCode')] = itm.get('participant', {}).get('name')
-                for ath in itm.get('teamAthletes', []):
-                    code = ath.get('participantCode')
-                    name = ath.get('athlete', {}).get('name') or ath.get('athlete', {}).get('shortName')
-                    athlete_map[code] = name
+            # build helper maps and per-team lineups in one pass over items
+            athlete_map, team_map, item_lineups = _index_items(items)
 
             # scorers
             out_body['scorers'] = _collect_scorers(res, athlete_map, team_map)
 
             # lineups (per-team)
             out_body.setdefault('lineups', {})
-            for idx, itm in enumerate(res.get('items', [])):
+            for itm, lineup in zip(items, item_lineups):
                 team_name = itm.get('participant', {}).get('name')
-                lineup = _build_lineup(itm)
                 # determine home/away by name match
                 if team_name == out_body['teams'].get('home'):
                     out_body['lineups']['home'] = lineup
                 elif team_name == out_body['teams'].get('away'):
                     out_body['lineups']['away'] = lineup
             # fallback if not set, assign based on ordering
-            if 'home' not in out_body['lineups'] and res.get('items'):
-                out_body['lineups']['home'] = _build_lineup(res.get('items')[0])
-            if 'away' not in out_body['lineups'] and res.get('items') and len(res.get('items')) > 1:
-                out_body['lineups']['away'] = _build_lineup(res.get('items')[1])
+            if 'home' not in out_body['lineups'] and item_lineups:
+                out_body['lineups']['home'] = item_lineups[0]
+            if 'away' not in out_body['lineups'] and len(item_lineups) > 1:
+                out_body['lineups']['away'] = item_lineups[1]
 
         else:
             # no res file: best-effort fill from main
@@ -345,8 +446,13 @@ def main():
 
     assembled = assemble(args.comp, args.event, args.lang, args.tmp)
 
-    with open(args.out, 'w', encoding='utf-8') as f:
-        json.dump(assembled, f, indent=2, ensure_ascii=False)
+    if orjson is not None:
+        # orjson emits UTF-8 without escaping, matching ensure_ascii=False below
+        with open(args.out, 'wb') as f:
+            f.write(orjson.dumps(assembled, option=orjson.OPT_INDENT_2))
+    else:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(assembled, f, indent=2, ensure_ascii=False)
 
     print(f"Wrote assembled response to {args.out}")
 
@@ -21,12 +21,13 @@ from __future__ import annotations
 
 import argparse
 import concurrent.futures
+import functools
+import json
 import os
-import re
 import sys
 import time
 from pathlib import Path
-from typing import Iterable, List
+from typing import Iterable, Iterator, List
 
 try:
     import requests
@@ -34,6 +35,12 @@ except Exception:
     print("This script requires the 'requests' package. Install with: pip install requests", file=sys.stderr)
     raise
 
+try:
+    import msgspec
+except ImportError:
+    # msgspec is optional; it only speeds up decoding of the downloaded JSON.
+    msgspec = None
+
 BASE_DEFAULT = "https://stacy.olympics.com/OG2024/data"
 DEFAULT_OUT = "tmp"
 
@@ -47,12 +54,19 @@ DEFAULT_HEADERS = {
 
 def normalize_filename(name: str) -> str:
     # remove common duplication suffix like ' (1)' before extension
-    return re.sub(r" \(\d+\)(?=\.json$)", "", name)
+    if not name.endswith(".json"):
+        return name
+    stem = name[:-5]
+    i = stem.rfind(" (")
+    if i < 0 or not stem.endswith(")") or not stem[i + 2:-1].isdecimal():
+        return name
+    return stem[:i] + ".json"
 
 
 # Event codes in filenames expect trailing '-' padding (e.g. `FBLMTEAM11------------`).
 # Users may pass the short event id (e.g. `FBLMTEAM11`) and it will be padded to the canonical length.
 
+@functools.lru_cache(maxsize=256)
 def canonicalize_event(event: str, total_len: int = 22, pad_char: str = "-") -> str:
     """Return a canonical event code with trailing padding.
 
@@ -73,6 +87,7 @@ def canonicalize_event(event: str, total_len: int = 22, pad_char: str = "-") ->
 
 
 
+@functools.lru_cache(maxsize=256)
 def build_filename(resource: str, comp: str | None, event: str | None, lang: str | None) -> str:
     """Build a filename from components.
 
@@ -95,22 +110,27 @@ def build_url(base_url: str, filename: str) -> str:
     return f"{base_url.rstrip('/')}/{quote(filename)}"
 
 
+# Bodies of files downloaded in this process, keyed by output path, so discovery
+# can decode them without reading the file back from disk.
+_DOWNLOADED: dict[Path, bytes] = {}
+
+
 def download_one(session: requests.Session, url: str, out_path: Path, insecure: bool, timeout: int = 30, max_retries: int = 3) -> bool:
     last_exc = None
     for attempt in range(1, max_retries + 1):
         try:
             # Use the provided session (pre-configured headers) to make the request.
-            with session.get(url, stream=True, timeout=timeout, verify=not insecure) as r:
+            with session.get(url, timeout=timeout, verify=not insecure) as r:
                 if r.status_code == 404:
                     print(f"NOT FOUND: {url}")
                     return False
                 r.raise_for_status()
+                # files are small JSON documents: keep the body and write it in one go
+                body = r.content
                 tmp_path = out_path.with_suffix(out_path.suffix + ".download")
-                with tmp_path.open("wb") as fh:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            fh.write(chunk)
+                tmp_path.write_bytes(body)
                 tmp_path.replace(out_path)
+                _DOWNLOADED[out_path] = body
                 return True
         except Exception as e:
             last_exc = e
@@ -121,28 +141,79 @@ def download_one(session: requests.Session, url: str, out_path: Path, insecure:
     return False
 
 
-def download_many(filenames: Iterable[str], base_url: str, out_dir: Path, insecure: bool, concurrency: int, force: bool) -> int:
-    out_dir.mkdir(parents=True, exist_ok=True)
-    filenames = list(dict.fromkeys(filenames))  # preserve order, dedupe
-    total = len(filenames)
-    print(f"Downloading {total} files to {out_dir} (concurrency={concurrency})")
+def is_fresh(session: requests.Session, url: str, out_path: Path, insecure: bool, timeout: int = 30) -> bool:
+    """Return True if the local copy of `url` has the size the server reports.
 
-    tasks = []
-    # create a session and apply default headers (including Referer) to reduce chance of 403
+    Uses a HEAD request asking for the identity encoding, so `Content-Length` is comparable
+    with the decoded body written by `download_one`. If the server gives no usable answer
+    the local file is kept (treated as fresh).
+    """
+    try:
+        r = session.head(url, timeout=timeout, verify=not insecure, allow_redirects=True, headers={"Accept-Encoding": "identity"})
+        length = r.headers.get("Content-Length")
+        if r.status_code != 200 or not length or not length.isdigit():
+            return True
+        return int(length) == out_path.stat().st_size
+    except Exception as e:
+        print(f"Freshness check failed for {url}: {e}. Keeping local file.")
+        return True
+
+
+def make_session(base_url: str, concurrency: int) -> requests.Session:
+    """Create a session whose keep-alive pool can serve `concurrency` workers at once.
+
+    Reusing one session across batches keeps connections (and their TLS handshakes) alive
+    between the main file download and the follow-up RES downloads.
+    """
     session = requests.Session()
+    # apply default headers (including Referer) to reduce chance of 403
     session.headers.update(DEFAULT_HEADERS)
     session.headers.setdefault("Referer", base_url)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download_many(filenames: Iterable[str], base_url: str, out_dir: Path, insecure: bool, concurrency: int, force: bool, session: requests.Session | None = None) -> int:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # a single directory listing replaces one stat() per file for the exists check
+    existing = set() if force else {entry.name for entry in os.scandir(out_dir)}
+
+    # normalize, dedupe (preserving order) and split off existing files in one pass
+    seen = set()
+    to_fetch = []
+    present = []
+    for name in filenames:
+        name = normalize_filename(name)
+        if name in seen:
+            continue
+        seen.add(name)
+        if name in existing:
+            present.append(name)
+        else:
+            to_fetch.append(name)
+    total = len(seen)
+    print(f"Downloading {total} files to {out_dir} (concurrency={concurrency})")
+
+    if session is None:
+        session = make_session(base_url, concurrency)
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
-        futures = {}
-        for name in filenames:
-            name = normalize_filename(name)
-            out_path = out_dir / name
-            if out_path.exists() and not force:
+        # existing files are only re-fetched when the server reports a different size;
+        # the HEAD requests reuse the session's keep-alive connections
+        checks = ex.map(lambda name: is_fresh(session, build_url(base_url, name), out_dir / name, insecure), present)
+        for name, fresh in zip(present, checks):
+            if fresh:
                 print(f"SKIP (exists): {name}")
-                continue
+            else:
+                print(f"STALE (size differs): {name}")
+                to_fetch.append(name)
+
+        futures = {}
+        for name in to_fetch:
             url = build_url(base_url, name)
-            fut = ex.submit(download_one, session, url, out_path, insecure)
+            fut = ex.submit(download_one, session, url, out_dir / name, insecure)
             futures[fut] = name
 
         completed = 0
@@ -156,6 +227,43 @@ def download_many(filenames: Iterable[str], base_url: str, out_dir: Path, insecu
     return 0
 
 
+# Reused decoder instance; avoids per-call setup when msgspec is installed.
+_JSON_DECODER = msgspec.json.Decoder() if msgspec is not None else None
+
+
+def load_main_json(main_json_path: Path) -> dict | None:
+    """Read and decode the main event JSON used for discovery.
+
+    Uses the in-memory body if the file was downloaded by this process.
+    Returns None (after printing the reason) if the file is missing or cannot be parsed.
+    """
+    raw = _DOWNLOADED.get(main_json_path)
+    if raw is None and not main_json_path.exists():
+        print(f"Main JSON not found for discovery: {main_json_path}")
+        return None
+
+    try:
+        if raw is None:
+            raw = main_json_path.read_bytes()
+        if _JSON_DECODER is not None:
+            return _JSON_DECODER.decode(raw)
+        return json.loads(raw)
+    except Exception as e:
+        print(f"Failed to parse JSON {main_json_path}: {e}")
+        return None
+
+
+def iter_units(event: dict) -> Iterator[dict]:
+    """Yield every unit of an event (`event.phases[].units[]`), skipping non-list entries."""
+    phases = event.get("phases", [])
+    if not isinstance(phases, list):
+        return
+    for phase in phases:
+        units = phase.get("units", [])
+        if isinstance(units, list):
+            yield from units
+
+
 def discover_related_files(main_json_path: Path, comp: str, lang: str) -> List[str]:
     """Parse the downloaded event JSON and discover related filenames to download.
 
@@ -164,19 +272,10 @@ def discover_related_files(main_json_path: Path, comp: str, lang: str) -> List[s
 
     Returns a list of filenames (not URLs) to attempt to download.
     """
-    import json
-
-    if not main_json_path.exists():
-        print(f"Main JSON not found for discovery: {main_json_path}")
+    data = load_main_json(main_json_path)
+    if data is None:
         return []
 
-    with main_json_path.open(encoding="utf-8") as fh:
-        try:
-            data = json.load(fh)
-        except Exception as e:
-            print(f"Failed to parse JSON {main_json_path}: {e}")
-            return []
-
     event_code = None
     event = data.get("event") or {}
     event_code = event.get("code") if isinstance(event, dict) else None
@@ -189,22 +288,21 @@ def discover_related_files(main_json_path: Path, comp: str, lang: str) -> List[s
     unit_codes = set()
     dates = set()
 
-    for phase in event.get("phases", []) if isinstance(event.get("phases", []), list) else []:
-        for unit in phase.get("units", []) if isinstance(phase.get("units", []), list) else []:
-            code = unit.get("code")
-            if code:
-                unit_codes.add(code)
-            schedule = unit.get("schedule") or {}
-            # schedule may contain a top-level startDate or a list of start entries
-            sd = schedule.get("startDate")
-            if sd:
-                dates.add(sd.split("T", 1)[0])
-            starts = schedule.get("start")
-            if isinstance(starts, list):
-                for s in starts:
-                    sd2 = s.get("startDate")
-                    if sd2:
-                        dates.add(sd2.split("T", 1)[0])
+    for unit in iter_units(event):
+        code = unit.get("code")
+        if code:
+            unit_codes.add(code)
+        schedule = unit.get("schedule") or {}
+        # schedule may contain a top-level startDate or a list of start entries
+        sd = schedule.get("startDate")
+        if sd:
+            dates.add(sd.split("T", 1)[0])
+        starts = schedule.get("start")
+        if isinstance(starts, list):
+            for s in starts:
+                sd2 = s.get("startDate")
+                if sd2:
+                    dates.add(sd2.split("T", 1)[0])
 
     filenames = []
 
@@ -248,29 +346,19 @@ def discover_needed_files(main_json_path: Path, comp: str, lang: str) -> List[st
 
     Currently this includes only `RES_ByRSC_H2H` files for each unit found in the main event JSON.
     """
-    import json
-
-    if not main_json_path.exists():
-        print(f"Main JSON not found for discovery: {main_json_path}")
+    data = load_main_json(main_json_path)
+    if data is None:
         return []
 
-    with main_json_path.open(encoding="utf-8") as fh:
-        try:
-            data = json.load(fh)
-        except Exception as e:
-            print(f"Failed to parse JSON {main_json_path}: {e}")
-            return []
-
     event = data.get("event") or {}
     event_code = event.get("code") if isinstance(event, dict) else None
     disc = event_code[:3].upper() if event_code and len(event_code) >= 3 else None
 
     unit_codes = set()
-    for phase in event.get("phases", []) if isinstance(event.get("phases", []), list) else []:
-        for unit in phase.get("units", []) if isinstance(phase.get("units", []), list) else []:
-            code = unit.get("code")
-            if code:
-                unit_codes.add(code)
+    for unit in iter_units(event):
+        code = unit.get("code")
+        if code:
+            unit_codes.add(code)
 
     filenames = []
     for uc in sorted(unit_codes):
@@ -298,8 +386,9 @@ def main(argv: List[str] | None = None) -> int:
     filename = build_filename("GLO_EventGames", args.comp, event_code, args.lang)
     files: List[str] = [filename]
 
-    # use fixed concurrency=4 and force=False
-    rc = download_many(files, BASE_DEFAULT, out_dir, args.insecure, 4, False)
+    # use fixed concurrency=4 and force=False; one session is shared by both batches
+    session = make_session(BASE_DEFAULT, 4)
+    rc = download_many(files, BASE_DEFAULT, out_dir, args.insecure, 4, False, session=session)
 
     # If the main file was downloaded, discover and download only the files needed by the assembler
     main_path = out_dir / normalize_filename(filename)
@@ -307,7 +396,7 @@ def main(argv: List[str] | None = None) -> int:
         related = discover_needed_files(main_path, args.comp, args.lang)
         if related:
             print("Attempting to download needed RES files only...")
-            download_many(related, BASE_DEFAULT, out_dir, args.insecure, 4, False)
+            download_many(related, BASE_DEFAULT, out_dir, args.insecure, 4, False, session=session)
     else:
         print(f"Main file not present after download: {main_path}. Skipping discovery.")
 